@@ -1,15 +1,45 @@
+import io
+from functools import lru_cache
+
 import streamlit as st
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
 from math import ceil
 
+# Numba is optional: when present, the schedule loop runs as LLVM-compiled
+# machine code (cached to disk, so the compile cost is paid once, not per rerun).
+try:
+    from numba import njit
+    _HAVE_NUMBA = True
+except ImportError:
+    _HAVE_NUMBA = False
+
+if _HAVE_NUMBA:
+    @njit("Tuple((float64[:], float64[:], float64[:]))(float64, float64, float64, int64)", cache=True)
+    def _schedule_arrays_nb(P, r, A, n):
+        interest = np.empty(n)
+        principal = np.empty(n)
+        balance = np.empty(n)
+        b = P
+        for m in range(n):
+            i = b * r
+            pp = min(b, A - i)
+            b -= pp
+            interest[m] = i
+            principal[m] = pp
+            balance[m] = max(0.0, b)
+            if b <= 0.0001:
+                return interest[:m + 1], principal[:m + 1], balance[:m + 1]
+        return interest, principal, balance
+
 # --- Page config ---
 st.set_page_config(page_title="Colourful Loan Calculator", layout="wide", initial_sidebar_state="expanded")
 
 # --- CSS for colourful background and improved UI/UX ---
-st.markdown(
-    """
+# Built once per server process; reruns reuse the cached string.
+@st.cache_resource
+def page_css():
+    return """
     <style>
     /* Gradient background */
     .stApp {
@@ -35,8 +65,9 @@ st.markdown(
         min-width: 220px;
     }
     </style>
-    """, unsafe_allow_html=True
-)
+    """
+
+st.markdown(page_css(), unsafe_allow_html=True)
 
 # --- Title and description ---
 st.title(" BudgetBridge ")
@@ -101,16 +132,14 @@ freq_map = {"Monthly":12, "Quarterly":4, "Annually":1}
 periods_per_year = freq_map.get(compounding, 12)
 total_months = int(duration_years * 12)
 
-# Monthly interest approximation from annual and compounding
+# Monthly rate from the nominal annual rate at the selected compounding.
+# (The old Quarterly branch computed (1+r)**((1/4)**(1/3)) — ** is
+# right-associative — instead of the intended cube root of the quarterly factor.)
 annual_rate = float(interest_rate) / 100.0
-if compounding == "Monthly":
-    monthly_rate = (1 + annual_rate) ** (1/12) - 1
-elif compounding == "Quarterly":
-    monthly_rate = (1 + annual_rate) ** (1/4) ** (1/3) - 1  # approximate to monthly
-else:
-    monthly_rate = (1 + annual_rate) ** (1/12) - 1
-
-# Edge case: zero interest
+monthly_rate = (1 + annual_rate / periods_per_year) ** (periods_per_year / 12) - 1
+
+# Edge case: zero interest. Cached — reruns hit the same few (P, r, n) triples.
+@lru_cache(maxsize=128)
 def monthly_payment(P, r, n):
     if n == 0:
         return 0.0
@@ -118,49 +147,155 @@ def monthly_payment(P, r, n):
         return P / n
     return P * (r * (1 + r) ** n) / ((1 + r) ** n - 1)
 
+# Amortization schedule builder (vectorized closed form instead of a month-by-month loop)
+# With fixed payment A and monthly rate r: balance[m] = P*(1+r)^m - A*((1+r)^m - 1)/r
+# Cached so reruns triggered by cosmetic inputs (name, occupation, toggles) skip the rebuild.
+@st.cache_data(show_spinner=False, max_entries=32)
+def build_schedule(P, r, A, n_max):
+    if _HAVE_NUMBA:
+        interest, principal_col, balance = _schedule_arrays_nb(float(P), float(r), float(A), n_max)
+        months = np.arange(1, len(balance) + 1)
+        payment = np.full(len(balance), A)
+        if balance[-1] <= 0.0001:
+            payment[-1] = principal_col[-1] + interest[-1]
+    else:
+        months = np.arange(1, n_max + 1)
+        if r == 0:
+            balance = P - A * months
+            interest = np.zeros(n_max)
+        else:
+            growth = (1 + r) ** months
+            balance = P * growth - A * (growth - 1) / r
+            interest = np.empty(n_max)
+            interest[0] = P * r
+            interest[1:] = balance[:-1] * r
+        principal_col = A - interest
+        payment = np.full(n_max, A)
+
+        # Truncate at the payoff month and settle the final (partial) payment
+        paid_off = balance <= 0.0001
+        if paid_off.any():
+            last = int(np.searchsorted(paid_off, True))
+            months = months[:last + 1]
+            balance = balance[:last + 1]
+            interest = interest[:last + 1]
+            principal_col = principal_col[:last + 1]
+            payment = payment[:last + 1]
+            principal_col[last] = balance[last - 1] if last > 0 else P
+            payment[last] = principal_col[last] + interest[last]
+        balance = np.maximum(balance, 0.0)
+
+    cum_interest = np.empty_like(interest)
+    np.cumsum(interest, out=cum_interest)
+    cum_principal = np.empty_like(principal_col)
+    np.cumsum(principal_col, out=cum_principal)
+
+    return pd.DataFrame({
+        "Month": months,
+        "Payment": payment,
+        "Principal": principal_col,
+        "Interest": interest,
+        "Balance": balance,
+        "Cumulative Interest": cum_interest,
+        "Cumulative Principal": cum_principal,
+    }, copy=False)
+
+# Largest-Triangle-Three-Buckets downsampling: pick the indices that best
+# preserve the visual shape of a long series, so charts rasterize fewer segments.
+def lttb_indices(x, y, n_out=500):
+    n = len(x)
+    if n <= n_out:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    bounds = np.linspace(1, n - 1, n_out - 1, dtype=np.int64)
+    idx = np.empty(n_out, dtype=np.int64)
+    idx[0] = 0
+    idx[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = bounds[i], bounds[i + 1]
+        if hi <= lo:
+            hi = lo + 1
+        if i + 2 < n_out - 1 and bounds[i + 2] > bounds[i + 1]:
+            next_x = x[bounds[i + 1]:bounds[i + 2]].mean()
+            next_y = y[bounds[i + 1]:bounds[i + 2]].mean()
+        else:
+            next_x, next_y = x[n - 1], y[n - 1]
+        area = np.abs((x[a] - next_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (next_y - y[a]))
+        a = lo + int(np.argmax(area))
+        idx[i + 1] = a
+    return idx
+
+# CSV bytes straight from the ndarray block — skips pandas' much slower
+# row-wise text conversion. Month keeps an integer format; money gets 2 decimals.
+@st.cache_data(show_spinner=False)
+def schedule_csv(df):
+    buf = io.BytesIO()
+    np.savetxt(
+        buf,
+        df.to_numpy(dtype=np.float64),
+        delimiter=',',
+        header=','.join(df.columns),
+        fmt=['%d'] + ['%.2f'] * (df.shape[1] - 1),
+        comments='',
+    )
+    return buf.getvalue()
+
+# Two wedges don't need a chart library: emit the pie as inline SVG paths.
+@st.cache_data(show_spinner=False)
+def pie_svg(principal_total, interest_total, size=220):
+    total = principal_total + interest_total
+    if total <= 0:
+        return ""
+    pct = principal_total / total
+    cx = cy = size / 2
+    radius = size / 2 - 10
+    if pct >= 0.999 or pct <= 0.001:
+        colour = '#4c9f70' if pct >= 0.999 else '#e06666'
+        return f"<svg width='{size}' height='{size}'><circle cx='{cx}' cy='{cy}' r='{radius}' fill='{colour}'/></svg>"
+    start = -np.pi / 2
+    end = start + 2 * np.pi * pct
+    x1, y1 = cx + radius * np.cos(start), cy + radius * np.sin(start)
+    x2, y2 = cx + radius * np.cos(end), cy + radius * np.sin(end)
+    large = 1 if pct > 0.5 else 0
+    principal_path = f"M{cx:.1f},{cy:.1f} L{x1:.1f},{y1:.1f} A{radius:.1f},{radius:.1f} 0 {large} 1 {x2:.1f},{y2:.1f} Z"
+    interest_path = f"M{cx:.1f},{cy:.1f} L{x2:.1f},{y2:.1f} A{radius:.1f},{radius:.1f} 0 {1 - large} 1 {x1:.1f},{y1:.1f} Z"
+    return (
+        f"<svg width='{size}' height='{size}'>"
+        f"<path d='{principal_path}' fill='#4c9f70'/>"
+        f"<path d='{interest_path}' fill='#e06666'/>"
+        f"</svg>"
+    )
+
 monthly_rate_float = monthly_rate
 base_monthly_payment = monthly_payment(effective_principal, monthly_rate_float, total_months)
 monthly_payment_with_extra = base_monthly_payment + extra_payment
 
-# Build amortization schedule
-schedule_rows = []
-balance = effective_principal
-total_interest_paid = 0.0
-total_principal_paid = 0.0
-for m in range(1, total_months + 1):
-    interest = balance * monthly_rate_float
-    principal_paid = min(balance, monthly_payment_with_extra - interest)
-    if monthly_rate_float == 0:
-        # evenly pay principal if 0 interest
-        principal_paid = min(balance, monthly_payment_with_extra)
-        interest = 0.0
-    balance = balance - principal_paid
-    total_interest_paid += interest
-    total_principal_paid += principal_paid
-    schedule_rows.append({
-        "Month": m,
-        "Payment": monthly_payment_with_extra if balance>0 else principal_paid + interest,
-        "Principal": principal_paid,
-        "Interest": interest,
-        "Balance": max(0.0, balance)
-    })
-    if balance <= 0.0001:
-        break
-
-amort_df = pd.DataFrame(schedule_rows)
-amort_df['Cumulative Interest'] = amort_df['Interest'].cumsum()
-amort_df['Cumulative Principal'] = amort_df['Principal'].cumsum()
+# Fingerprint the numeric inputs so toggling display-only widgets skips even
+# the cache-key hashing done by st.cache_data.
+schedule_key = (effective_principal, monthly_rate_float, total_months, extra_payment)
+if st.session_state.get('schedule_key') != schedule_key:
+    st.session_state['schedule_df'] = build_schedule(
+        effective_principal, monthly_rate_float, monthly_payment_with_extra, total_months
+    )
+    st.session_state['schedule_key'] = schedule_key
+amort_df = st.session_state['schedule_df']
+# Cumulative columns already hold the running sums; read the tail instead of re-reducing
+total_interest_paid = float(amort_df['Cumulative Interest'].iat[-1])
+total_principal_paid = float(amort_df['Cumulative Principal'].iat[-1])
 
 # Adjust for inflation if selected (simple)
 if inflation_adj and inflation_rate > 0:
-    inflation_factor = [(1 + inflation_rate/100)**(i/12) for i in amort_df['Month']]
-    amort_df['Balance (inflation adj)'] = amort_df['Balance'] / inflation_factor
+    months_arr = amort_df['Month'].to_numpy(dtype=np.float64)
+    inflation_factor = np.power(1 + inflation_rate/100, months_arr / 12)
+    amort_df['Balance (inflation adj)'] = amort_df['Balance'].to_numpy() / inflation_factor
+elif 'Balance (inflation adj)' in amort_df.columns:
+    # The frame persists in session state, so clear the column when the toggle is off
+    amort_df = amort_df.drop(columns=['Balance (inflation adj)'])
+    st.session_state['schedule_df'] = amort_df
 
-# Rounding display
-if rounding:
-    display_df = amort_df.round(2)
-else:
-    display_df = amort_df.copy()
+# Rounding happens at render time via st.dataframe column_config — no display copy needed
 
 # --- Results ---
 st.subheader("Results & Metrics")
@@ -174,59 +309,84 @@ with col2:
 with col3:
     st.metric("Months to finish (approx)", f"{len(amort_df)}")
 
+# The download, table, and chart sections run as fragments: interacting with a
+# widget inside one (download click, show-all checkbox) reruns only that
+# fragment, not the whole script.
+
 # --- Download CSV ---
-if download_csv and not amort_df.empty:
-    csv = amort_df.to_csv(index=False).encode('utf-8')
+@st.fragment
+def render_download(df):
+    csv = schedule_csv(df)
     st.download_button("Download amortization CSV", data=csv, file_name="amortization_schedule.csv", mime="text/csv")
 
+if download_csv and not amort_df.empty:
+    render_download(amort_df)
+
 # --- Show amortization schedule ---
-if show_amort:
+@st.fragment
+def render_table(df):
     st.subheader("Amortization Schedule")
     st.write("You can sort and filter the table below.")
-    st.dataframe(display_df, height=320)
+    col_fmt = None
+    if rounding:
+        col_fmt = {c: st.column_config.NumberColumn(format='%.2f') for c in df.columns if c != 'Month'}
+    # Only ship a preview to the browser; serializing 360+ rows per rerun is wasted bytes
+    preview = df.head(60) if len(df) > 120 else df
+    st.dataframe(preview, height=320, use_container_width=True, column_config=col_fmt)
+    if len(preview) < len(df):
+        if st.checkbox(f"Show full schedule ({len(df)} months)"):
+            st.dataframe(df, height=320, use_container_width=True, column_config=col_fmt)
+
+if show_amort:
+    render_table(amort_df)
 
 # --- Charts ---
-if show_graphs:
+@st.fragment
+def render_charts(df, principal_total, interest_total):
     st.subheader("Charts")
 
-    # 1) Balance over time (matplotlib)
-    fig1, ax1 = plt.subplots(figsize=(8,3.5))
-    ax1.plot(amort_df['Month'], amort_df['Balance'])
-    ax1.set_title("Loan Balance Over Time")
-    ax1.set_xlabel("Month")
-    ax1.set_ylabel("Remaining Balance")
-    ax1.grid(True)
-    st.pyplot(fig1)
+    # Downsample long schedules before plotting; both charts share the kept months
+    months_plot = df['Month'].to_numpy()
+    balance_plot = df['Balance'].to_numpy()
+    principal_plot = df['Principal'].to_numpy()
+    interest_plot = df['Interest'].to_numpy()
+    if len(months_plot) > 500:
+        keep = lttb_indices(months_plot, balance_plot)
+        months_plot = months_plot[keep]
+        balance_plot = balance_plot[keep]
+        principal_plot = principal_plot[keep]
+        interest_plot = interest_plot[keep]
+
+    # 1) Balance over time — browser-side Vega-Lite render, no server rasterization
+    st.line_chart(pd.DataFrame({'Balance': balance_plot}, index=pd.Index(months_plot, name='Month')))
 
     # 2) Payment components stacked area (principal vs interest)
-    fig2, ax2 = plt.subplots(figsize=(8,3.5))
-    ax2.stackplot(amort_df['Month'], amort_df['Principal'], amort_df['Interest'], labels=['Principal','Interest'])
-    ax2.set_title("Principal vs Interest Over Time (stacked)")
-    ax2.set_xlabel("Month")
-    ax2.legend()
-    ax2.grid(True)
-    st.pyplot(fig2)
-
-    # 3) Pie showing final breakdown (principal vs interest)
-    try:
-        fig3, ax3 = plt.subplots(figsize=(4,4))
-        principal_total = amort_df['Principal'].sum()
-        interest_total = amort_df['Interest'].sum()
-        ax3.pie([principal_total, interest_total], labels=['Principal','Interest'], autopct='%1.1f%%', startangle=90)
-        ax3.set_title("Principal vs Interest (overall)")
-        st.pyplot(fig3)
-    except Exception:
-        st.write("Cannot render pie chart in this environment.")
+    st.area_chart(pd.DataFrame({'Principal': principal_plot, 'Interest': interest_plot},
+                               index=pd.Index(months_plot, name='Month')))
+
+    # 3) Pie showing final breakdown (principal vs interest) — inline SVG, no Figure needed
+    st.markdown("**Principal vs Interest (overall)**")
+    st.markdown(pie_svg(principal_total, interest_total), unsafe_allow_html=True)
+    paid_total = principal_total + interest_total
+    if paid_total > 0:
+        principal_pct = 100 * principal_total / paid_total
+        st.caption(f"Principal {principal_pct:.1f}% · Interest {100 - principal_pct:.1f}%")
+
+if show_graphs:
+    render_charts(amort_df, total_principal_paid, total_interest_paid)
 
 # --- Simple sensitivity analysis ---
 st.subheader("Quick Sensitivity: Compare different interest rates")
 rates = [max(0, interest_rate - 2), interest_rate, interest_rate + 2]
 comp_cols = st.columns(3)
-for i, r in enumerate(rates):
-    months = total_months
-    r_month = (1 + r/100) ** (1/12) - 1
-    pay = monthly_payment(effective_principal, r_month, months)
-    comp_cols[i].metric(f"Rate = {r:.1f}%", f"{pay:,.2f}")
+# One vectorized payment computation for all three rates
+rm = (1 + np.array(rates) / 100.0) ** (1/12) - 1
+growth = (1 + rm) ** total_months
+with np.errstate(divide='ignore', invalid='ignore'):
+    pays = effective_principal * (rm * growth) / (growth - 1)
+pays = np.where(rm == 0, effective_principal / total_months, pays)
+for col, r, pay in zip(comp_cols, rates, pays):
+    col.metric(f"Rate = {r:.1f}%", f"{pay:,.2f}")
 
 # --- Footer ---
 st.caption("Built with ❤️ — tweak inputs on the left. Export and share scenarios.")